@@ -69,6 +69,8 @@ void setup() {
   espClient.setInsecure();
   client.setServer(MQTT_BROKER_HOST, MQTT_BROKER_PORT);
   client.setKeepAlive(60);
+  // ACKs arrive batched (up to 20 per message), more than the 256 B default
+  client.setBufferSize(4096);
   client.setCallback(callback);
   
   // Initialize DHT sensor
@@ -84,13 +86,10 @@ void callback(char* topic, byte* payload, unsigned int length) {
   Serial.print(" ===");
   Serial.println();
   
-  String message;
-  for (unsigned int i = 0; i < length; i++) {
-    message += (char)payload[i];
-  }
-  
-  StaticJsonDocument<512> doc;
-  DeserializationError error = deserializeJson(doc, message);
+  // ACKs are batched by the server as parallel arrays, index i is one ACK:
+  // {"success":[..],"device_id":[..],"mac_address":[..],"timestamp":[..],"log_id":[..],"error":[..]}
+  DynamicJsonDocument doc(8192);
+  DeserializationError error = deserializeJson(doc, payload, length);
   
   if (error) {
     Serial.println("❌ JSON Parse Error!");
@@ -99,33 +98,47 @@ void callback(char* topic, byte* payload, unsigned int length) {
     return;
   }
   
-  bool success = doc["success"] | false;
-  const char* device_id = doc["device_id"] | "N/A";
-  const char* mac_addr = doc["mac_address"] | "N/A";
-  const char* timestamp = doc["timestamp"] | "N/A";
-  
-  Serial.print("🆔 Device ID: ");
-  Serial.println(device_id);
-  Serial.print("💻 MAC Address: ");
-  Serial.println(mac_addr);
-  Serial.print("🕒 Timestamp: ");
-  Serial.println(timestamp);
+  JsonArray successes = doc["success"];
+  JsonArray device_ids = doc["device_id"];
+  JsonArray mac_addrs = doc["mac_address"];
+  JsonArray timestamps = doc["timestamp"];
+  JsonArray log_ids = doc["log_id"];
+  JsonArray errors = doc["error"];
   
-  if (success) {
-    int log_id = doc["log_id"] | 0;
-    const char* message_text = doc["message"] | "Data logged successfully";
-    Serial.println("✅ Status: SUCCESS");
-    Serial.print("📊 Log ID: ");
-    Serial.println(log_id);
-    Serial.print("🧾 Message: ");
-    Serial.println(message_text);
-    Serial.println("🎉 Data successfully saved to database!");
-  } else {
-    const char* error_msg = doc["error"] | "Unknown error";
-    Serial.println("❌ Status: FAILED");
-    Serial.print("👉 Error: ");
-    Serial.println(error_msg);
-    Serial.println("⚠️ Data was NOT saved to database!");
+  for (size_t i = 0; i < successes.size(); i++) {
+    const char* mac_addr = mac_addrs[i] | "N/A";
+    
+    // The ACK topic is shared, skip entries for other devices
+    if (mac_address != mac_addr) {
+      continue;
+    }
+    
+    bool success = successes[i] | false;
+    const char* device_id = device_ids[i] | "N/A";
+    const char* timestamp = timestamps[i] | "N/A";
+    
+    Serial.print("🆔 Device ID: ");
+    Serial.println(device_id);
+    Serial.print("💻 MAC Address: ");
+    Serial.println(mac_addr);
+    Serial.print("🕒 Timestamp: ");
+    Serial.println(timestamp);
+    
+    if (success) {
+      int log_id = log_ids[i] | 0;
+      Serial.println("✅ Status: SUCCESS");
+      Serial.print("📊 Log ID: ");
+      Serial.println(log_id);
+      Serial.print("🧾 Message: ");
+      Serial.println("Data logged successfully");
+      Serial.println("🎉 Data successfully saved to database!");
+    } else {
+      const char* error_msg = errors[i] | "Unknown error";
+      Serial.println("❌ Status: FAILED");
+      Serial.print("👉 Error: ");
+      Serial.println(error_msg);
+      Serial.println("⚠️ Data was NOT saved to database!");
+    }
   }
 }
 
@@ -11,13 +11,22 @@ Requirements:
   - Python 3.8+
   - Docker (for --deploy docker and --clean)
   - MySQL DBMS (for --deploy manual)
+
+Environment:
+  DHT_SETUP_VERBOSE=1                # Print full command lines
 """
 
+import os
 import sys
 import platform
 import subprocess
 import shutil
+import shlex
+import hashlib
+import fnmatch
+from functools import lru_cache
 from pathlib import Path
+from venv import EnvBuilder
 
 # =====================================================
 # ANSI Color Codes for Terminal Output
@@ -33,21 +42,33 @@ class Colors:
   BOLD = '\033[1m'
   UNDERLINE = '\033[4m'
 
+# Precomputed level prefixes
+_PREFIX_INFO = f"{Colors.OKCYAN}[INFO]{Colors.ENDC} "
+_PREFIX_SUCCESS = f"{Colors.OKGREEN}[SUCCESS]{Colors.ENDC} "
+_PREFIX_ERROR = f"{Colors.FAIL}[ERROR]{Colors.ENDC} "
+_PREFIX_WARNING = f"{Colors.WARNING}[WARNING]{Colors.ENDC} "
+
+def _log(prefix: str, msg: str):
+  """Write prefixed message to stdout"""
+  sys.stdout.write(prefix)
+  sys.stdout.write(msg)
+  sys.stdout.write("\n")
+
 def print_info(msg: str):
   """Print info message"""
-  print(f"{Colors.OKCYAN}[INFO]{Colors.ENDC} {msg}")
+  _log(_PREFIX_INFO, msg)
 
 def print_success(msg: str):
   """Print success message"""
-  print(f"{Colors.OKGREEN}[SUCCESS]{Colors.ENDC} {msg}")
+  _log(_PREFIX_SUCCESS, msg)
 
 def print_error(msg: str):
   """Print error message"""
-  print(f"{Colors.FAIL}[ERROR]{Colors.ENDC} {msg}")
+  _log(_PREFIX_ERROR, msg)
 
 def print_warning(msg: str):
   """Print warning message"""
-  print(f"{Colors.WARNING}[WARNING]{Colors.ENDC} {msg}")
+  _log(_PREFIX_WARNING, msg)
 
 def print_header(msg: str):
   """Print header message"""
@@ -59,7 +80,24 @@ def print_header(msg: str):
 # Helper Functions
 # =====================================================
 
-def run_command(cmd: list, cwd: str | None = None, shell: bool = False) -> bool:
+# Children only need stdio, so don't ask CPython to close inherited fds.
+# With close_fds=False, no cwd and an executable given as a path, subprocess
+# can use posix_spawn() instead of the fork()+exec() path, so callers pass
+# absolute paths rather than cwd (no-op on Windows, where handles aren't
+# inherited anyway).
+CLOSE_FDS = sys.platform == "win32"
+
+# Set DHT_SETUP_VERBOSE=1 to echo full command lines
+_VERBOSE = os.environ.get("DHT_SETUP_VERBOSE") == "1"
+
+# Digest of the last successfully built Docker context (inside web/)
+DEPLOY_CACHE_FILE = ".deploy_cache"
+
+# Build definition files, always part of the digest even though .dockerignore
+# keeps them out of the context sent to the daemon
+BUILD_FILES = ("Dockerfile", "docker-compose.yml")
+
+def run_command(cmd: list, cwd: str | None = None, shell: bool = False, env: dict | None = None) -> bool:
   """
   Run shell command and return success status
   
@@ -67,47 +105,65 @@ def run_command(cmd: list, cwd: str | None = None, shell: bool = False) -> bool:
     cmd: Command as list of strings
     cwd: Working directory
     shell: Use shell execution
+    env: Extra environment variables for the command
   
   Returns:
     True if command succeeded, False otherwise
   """
   try:
-    print_info(f"Running: {' '.join(cmd)}")
-    result = subprocess.run(
-      cmd,
+    print_info(f"Running: {shlex.join(cmd) if _VERBOSE else cmd[0]}")
+    # posix_spawn() needs a path, not a bare name looked up on PATH
+    executable = cmd[0] if shell or os.path.dirname(cmd[0]) else shutil.which(cmd[0])
+    if executable is None:
+      raise FileNotFoundError(cmd[0])
+    # Stream output line by line instead of buffering it all in memory
+    with subprocess.Popen(
+      [executable, *cmd[1:]] if not shell else cmd,
       cwd=cwd,
       shell=shell,
-      check=True,
+      env={**os.environ, **env} if env else None,
       stdout=subprocess.PIPE,
-      stderr=subprocess.PIPE,
+      stderr=subprocess.STDOUT,
       text=True,
+      bufsize=1,        # Line buffered
       encoding='utf-8', # Fix error decoding output
-      errors='replace'  # Replace invalid chars with ?
-    )
-    if result.stdout:
-      print(result.stdout)
+      errors='replace', # Replace invalid chars with ?
+      close_fds=CLOSE_FDS
+    ) as proc:
+      for line in proc.stdout:
+        sys.stdout.write(line)
+      returncode = proc.wait()
+    if returncode != 0:
+      print_error(f"Command failed with exit code {returncode}: {cmd[0]}")
+      return False
     return True
-  except subprocess.CalledProcessError as e:
-    print_error(f"Command failed: {e}")
-    if e.stderr:
-      print(e.stderr)
-    return False
   except FileNotFoundError:
     print_error(f"Command not found: {cmd[0]}")
     return False
 
+@lru_cache(maxsize=1)
 def check_docker_installed() -> bool:
-  """Check if Docker is installed"""
+  """Check if Docker is installed (PATH lookup, no `docker --version` spawn)"""
+  return shutil.which("docker") is not None
+
+def create_venv(venv_dir: Path) -> bool:
+  """
+  Create virtual environment in-process with venv.EnvBuilder
+
+  Falls back to `python -m venv` in a subprocess if EnvBuilder fails.
+
+  Args:
+    venv_dir: Target virtual environment directory
+
+  Returns:
+    True if venv was created, False otherwise
+  """
   try:
-    subprocess.run(
-      ["docker", "--version"],
-      check=True,
-      stdout=subprocess.PIPE,
-      stderr=subprocess.PIPE
-    )
+    EnvBuilder(with_pip=True, clear=False, symlinks=(os.name != "nt")).create(str(venv_dir))
     return True
-  except (subprocess.CalledProcessError, FileNotFoundError):
-    return False
+  except Exception as e:
+    print_warning(f"⚠️ EnvBuilder failed ({e}), retrying with python -m venv...")
+    return run_command([sys.executable, "-m", "venv", str(venv_dir)])
 
 def check_python_version() -> bool:
   """Check if Python version is 3.8+"""
@@ -116,10 +172,12 @@ def check_python_version() -> bool:
     return True
   return False
 
+@lru_cache(maxsize=1)
 def get_web_dir() -> Path:
   """Get web directory path"""
-  return Path(__file__).parent / "web"
+  return Path(__file__).resolve().parent / "web"
 
+@lru_cache(maxsize=1)
 def get_venv_activate_script() -> str:
   """Get virtual environment activation script based on OS"""
   system = platform.system()
@@ -130,6 +188,57 @@ def get_venv_activate_script() -> str:
   else:  # Linux/Mac
     return str(web_dir / ".venv" / "bin" / "activate")
 
+def _scan_web(web_dir: Path) -> set[str]:
+  """Get names of all entries in web directory with a single scandir pass"""
+  with os.scandir(web_dir) as it:
+    return {entry.name for entry in it}
+
+def _load_dockerignore(web_dir: Path) -> list:
+  """Read .dockerignore patterns (comments and blank lines skipped)"""
+  ignore_file = web_dir / ".dockerignore"
+  if not ignore_file.exists():
+    return []
+  patterns = []
+  for line in ignore_file.read_text(encoding='utf-8').splitlines():
+    line = line.strip()
+    if line and not line.startswith("#"):
+      patterns.append(line.rstrip("/"))
+  return patterns
+
+def _context_digest(web_dir: Path) -> str:
+  """
+  Compute a content digest of the Docker build context
+
+  Args:
+    web_dir: Docker build context directory
+
+  Returns:
+    Hex digest of BUILD_FILES plus every file not excluded by .dockerignore
+  """
+  patterns = _load_dockerignore(web_dir) + [DEPLOY_CACHE_FILE, "__pycache__", *BUILD_FILES]
+  digest = hashlib.blake2b(digest_size=16)
+  for name in BUILD_FILES:
+    build_file = web_dir / name
+    if build_file.is_file():
+      digest.update(name.encode('utf-8'))
+      digest.update(build_file.read_bytes())
+  for root, dirs, files in os.walk(web_dir):
+    rel_root = Path(root).relative_to(web_dir)
+    # Prune ignored directories so we never descend into e.g. .venv
+    dirs[:] = sorted(
+      d for d in dirs
+      if not any(fnmatch.fnmatch((rel_root / d).as_posix(), p) or fnmatch.fnmatch(d, p) for p in patterns)
+    )
+    for name in sorted(files):
+      rel_path = (rel_root / name).as_posix()
+      if any(fnmatch.fnmatch(rel_path, p) for p in patterns):
+        continue
+      digest.update(rel_path.encode('utf-8'))
+      with open(Path(root) / name, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+          digest.update(chunk)
+  return digest.hexdigest()
+
 # =====================================================
 # Deployment Functions
 # =====================================================
@@ -154,15 +263,18 @@ def deploy_docker():
   
   print_info(f"📂 Working directory: {web_dir}")
   
+  # Read directory entries once instead of stat()-ing each file
+  entries = _scan_web(web_dir)
+  
   # Check if .env file exists
   env_file = web_dir / ".env"
-  if not env_file.exists():
+  if ".env" not in entries:
     print_warning("⚠️ .env file not found")
     print_info("Copying .env.example to .env...")
     
     env_example = web_dir / ".env.example"
-    if env_example.exists():
-      shutil.copy(env_example, env_file)
+    if ".env.example" in entries:
+      shutil.copyfile(env_example, env_file)
       print_success("✅ .env file created. Please configure it before running.")
     else:
       print_error("❌ .env.example not found!")
@@ -170,26 +282,36 @@ def deploy_docker():
   
   # Check if emqxsl-ca.crt exists
   ca_cert = web_dir / "emqxsl-ca.crt"
-  if not ca_cert.exists():
+  if "emqxsl-ca.crt" not in entries:
     print_warning("⚠️ emqxsl-ca.crt not found")
     print_info("Copying emqxsl-ca.crt.example...")
     
     ca_cert_example = web_dir / "emqxsl-ca.crt.example"
-    if ca_cert_example.exists():
-      shutil.copy(ca_cert_example, ca_cert)
+    if "emqxsl-ca.crt.example" in entries:
+      shutil.copyfile(ca_cert_example, ca_cert)
       print_success("✅ CA certificate created")
     else:
       print_error("❌ emqxsl-ca.crt.example not found!")
       return False
   
+  # Only rebuild the image when the build context changed
+  cache_file = web_dir / DEPLOY_CACHE_FILE
+  digest = _context_digest(web_dir)
+  cached_digest = cache_file.read_text(encoding='utf-8').strip() if DEPLOY_CACHE_FILE in entries else None
+  
+  # -f instead of cwd: compose still resolves .env and build paths from web/
+  compose_cmd = ["docker", "compose", "-f", str(web_dir / "docker-compose.yml"), "up", "-d"]
+  if digest != cached_digest:
+    compose_cmd.append("--build")
+  else:
+    print_info("♻️ Build context unchanged, skipping image rebuild")
+  
   # Run docker compose
   print_info("🚀 Starting Docker Compose...")
-  success = run_command(
-    ["docker", "compose", "up", "--build", "-d"],
-    cwd=str(web_dir)
-  )
+  success = run_command(compose_cmd)
   
   if success:
+    cache_file.write_text(digest, encoding='utf-8')
     print_success("✅ Docker deployment successful!")
     print_info("📊 Access dashboard at: http://localhost:1337")
     return True
@@ -217,15 +339,18 @@ def deploy_manual():
   
   print_info(f"📂 Working directory: {web_dir}")
   
+  # Read directory entries once instead of stat()-ing each file
+  entries = _scan_web(web_dir)
+  
   # Check if .env file exists
   env_file = web_dir / ".env"
-  if not env_file.exists():
+  if ".env" not in entries:
     print_warning("⚠️ .env file not found")
     print_info("Copying .env.example to .env...")
     
     env_example = web_dir / ".env.example"
-    if env_example.exists():
-      shutil.copy(env_example, env_file)
+    if ".env.example" in entries:
+      shutil.copyfile(env_example, env_file)
       print_success("✅ .env file created")
       print_warning("⚠️ Please configure .env file before running!")
     else:
@@ -234,13 +359,13 @@ def deploy_manual():
   
   # Check if emqxsl-ca.crt exists
   ca_cert = web_dir / "emqxsl-ca.crt"
-  if not ca_cert.exists():
+  if "emqxsl-ca.crt" not in entries:
     print_warning("⚠️ emqxsl-ca.crt not found")
     print_info("Copying emqxsl-ca.crt.example...")
     
     ca_cert_example = web_dir / "emqxsl-ca.crt.example"
-    if ca_cert_example.exists():
-      shutil.copy(ca_cert_example, ca_cert)
+    if "emqxsl-ca.crt.example" in entries:
+      shutil.copyfile(ca_cert_example, ca_cert)
       print_success("✅ CA certificate created")
     else:
       print_error("❌ emqxsl-ca.crt.example not found!")
@@ -248,12 +373,9 @@ def deploy_manual():
   
   # Create virtual environment
   venv_dir = web_dir / ".venv"
-  if not venv_dir.exists():
+  if ".venv" not in entries:
     print_info("📦 Creating virtual environment...")
-    success = run_command(
-      [sys.executable, "-m", "venv", ".venv"],
-      cwd=str(web_dir)
-    )
+    success = create_venv(venv_dir)
     if not success:
       print_error("❌ Failed to create virtual environment!")
       return False
@@ -272,14 +394,15 @@ def deploy_manual():
   
   # Install dependencies
   requirements_file = web_dir / "requirements-prod.txt"
-  if not requirements_file.exists():
+  if "requirements-prod.txt" not in entries:
     print_error(f"❌ requirements-prod.txt not found: {requirements_file}")
     return False
   
   print_info("📥 Installing dependencies from requirements-prod.txt...")
+  # Keep pip's wheel cache local to the project so repeat deploys are cache hits
   success = run_command(
-    [pip_cmd, "install", "-r", "requirements-prod.txt", "--no-cache-dir"],
-    cwd=str(web_dir)
+    [pip_cmd, "install", "-r", str(requirements_file), "--prefer-binary", "--disable-pip-version-check"],
+    env={"PIP_CACHE_DIR": str(web_dir / ".pip-cache")}
   )
   
   if not success:
@@ -324,17 +447,20 @@ def clean_docker():
   # Stop and remove containers + volumes
   print_info("🛑 Stopping containers and removing volumes...")
   success1 = run_command(
-    ["docker", "compose", "down", "-v"],
-    cwd=str(web_dir)
+    ["docker", "compose", "-f", str(web_dir / "docker-compose.yml"), "down", "-v"]
   )
   
   # Remove Docker image
   print_info("🗑️ Removing Docker image...")
   success2 = run_command(
-    ["docker", "image", "rm", "-f", "fastapi_dht:v0.1.5"],
-    cwd=str(web_dir)
+    ["docker", "image", "rm", "-f", "fastapi_dht:v0.1.5"]
   )
   
+  # Image is gone, so the next deploy must rebuild it
+  cache_file = web_dir / DEPLOY_CACHE_FILE
+  if cache_file.exists():
+    cache_file.unlink()
+  
   if success1 and success2:
     print_success("✅ Docker cleanup successful!")
     return True
@@ -5,6 +5,9 @@ from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
 
+# Hard ceiling for pool maxsize, oversized pools lose throughput to contention
+POOL_MAX_CEILING = 50
+
 class Database:
   def __init__(self):
     self.pool: Optional[aiomysql.Pool] = None
@@ -16,10 +19,15 @@ class Database:
     user: str,
     password: str,
     db: str,
-    minsize: int = 5,
-    maxsize: int = 20
+    minsize: int = 1,
+    maxsize: int = 25,
+    pool_recycle: int = 3600
   ):
     """Create connection pool with proper authentication"""
+    if maxsize > POOL_MAX_CEILING:
+      logger.warning(f"⚠️ Pool maxsize {maxsize} capped at {POOL_MAX_CEILING}")
+      maxsize = POOL_MAX_CEILING
+    
     try:
       self.pool = await aiomysql.create_pool(
         host=host,
@@ -29,7 +37,11 @@ class Database:
         db=db,
         minsize=minsize,
         maxsize=maxsize,
-        autocommit=False,
+        # Recycle connections before MySQL's wait_timeout drops them
+        pool_recycle=pool_recycle,
+        # Single statements commit themselves; get_cursor() opens an
+        # explicit transaction only where several statements must be atomic
+        autocommit=True,
         charset='utf8mb4',
         # Enable caching_sha2_password support
         auth_plugin='caching_sha2_password',
@@ -49,14 +61,29 @@ class Database:
       await self.pool.wait_closed()
       logger.info("🔒 Database pool closed")
   
+  def pool_stats(self) -> Optional[dict]:
+    """Current pool usage (size = open connections, free = idle ones)"""
+    if not self.pool:
+      return None
+    return {
+      "size": self.pool.size,
+      "free": self.pool.freesize,
+      "used": self.pool.size - self.pool.freesize,
+      "minsize": self.pool.minsize,
+      "maxsize": self.pool.maxsize
+    }
+  
   @asynccontextmanager
-  async def get_cursor(self):
-    """Get database cursor from pool"""
+  async def get_cursor(self, dict_cursor: bool = True):
+    """Get transactional cursor from pool (tuple rows when dict_cursor=False)"""
     if not self.pool:
       raise RuntimeError("Database pool not initialized")
     
     async with self.pool.acquire() as conn:
-      async with conn.cursor(aiomysql.DictCursor) as cursor:
+      # BEGIN/COMMIT bracket the block; the connection returns to the
+      # pool in autocommit mode either way
+      await conn.begin()
+      async with conn.cursor(aiomysql.DictCursor if dict_cursor else aiomysql.Cursor) as cursor:
         try:
           yield cursor
         except Exception as e:
@@ -65,6 +92,18 @@ class Database:
           raise
         else:
           await conn.commit()
+  
+  @asynccontextmanager
+  async def get_readonly_cursor(self, dict_cursor: bool = True):
+    """Get autocommit cursor for SELECT-only work (no COMMIT round-trip)"""
+    if not self.pool:
+      raise RuntimeError("Database pool not initialized")
+    
+    async with self.pool.acquire() as conn:
+      # Pool connections are autocommit, so each SELECT ends its own
+      # implicit transaction without an explicit commit/rollback
+      async with conn.cursor(aiomysql.DictCursor if dict_cursor else aiomysql.Cursor) as cursor:
+        yield cursor
 
 # Singleton instance
 db = Database()
\ No newline at end of file
@@ -1,30 +1,36 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import Response, HTMLResponse, StreamingResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from os.path import join, dirname
+from typing import Optional
+from datetime import datetime, timedelta
 import logging
 import asyncio
-import json
+import hashlib
+import orjson
+from collections import deque
+from itertools import islice
 
 from src.config import get_settings
 from src.database import db
 from src.models import (
   init_tables, 
+  start_insert_flusher,
+  stop_insert_flusher,
   get_latest_readings, 
   get_device_stats, 
   get_device_logs,
   get_logs_by_mac,
   get_total_logs,
+  get_logs_overview,
   get_device_chart_data,
+  get_current_reading,
   get_all_devices,
   get_all_devices_chart_data
 )
-from src.mqtt import (
-  mqtt_client,
-  set_broadcast_callback
-)
+from src.mqtt import mqtt_client
 
 # Logging setup
 logging.basicConfig(
@@ -39,6 +45,23 @@ logger = logging.getLogger(__name__)
 
 env = get_settings()
 
+# Hot settings bound once, skips the pydantic attribute lookup per request
+APP_VERSION = env.APP_VERSION
+
+# Seconds between pool usage log lines
+POOL_STATS_INTERVAL = 30
+
+async def log_pool_stats():
+  """Periodically log pool usage to help size MYSQL_POOL_MAX_SIZE"""
+  while True:
+    await asyncio.sleep(POOL_STATS_INTERVAL)
+    stats = db.pool_stats()
+    if stats:
+      logger.info(
+        f"📈 DB pool: {stats['used']} used, {stats['free']} free, "
+        f"{stats['size']}/{stats['maxsize']} open"
+      )
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
   """Manage application lifecycle (startup & shutdown)"""
@@ -53,14 +76,21 @@ async def lifespan(app: FastAPI):
     password=env.MYSQL_PASSWORD,
     db=env.MYSQL_DATABASE,
     minsize=env.MYSQL_POOL_MIN_SIZE,
-    maxsize=env.MYSQL_POOL_MAX_SIZE
+    maxsize=env.MYSQL_POOL_MAX_SIZE,
+    pool_recycle=env.MYSQL_POOL_RECYCLE
   )
   
   # Initialize tables
   await init_tables()
   
+  # Start batched insert writer
+  start_insert_flusher()
+  
+  # Start pool usage logging
+  pool_stats_task = asyncio.create_task(log_pool_stats())
+  
   # Set broadcast callback for SSE
-  await set_broadcast_callback(broadcast_new_log)
+  mqtt_client.set_broadcast(broadcast_new_log)
   
   # Connect to MQTT broker
   await mqtt_client.connect()
@@ -75,6 +105,12 @@ async def lifespan(app: FastAPI):
   # Disconnect MQTT
   await mqtt_client.disconnect()
   
+  # Stop pool usage logging
+  pool_stats_task.cancel()
+  
+  # Write any queued readings before the pool goes away
+  await stop_insert_flusher()
+  
   # Close database pool
   await db.close_pool()
   
@@ -86,50 +122,120 @@ async def lifespan(app: FastAPI):
 
 app: FastAPI = FastAPI(
   title="DHT Logger API",
-  version=env.APP_VERSION,
+  version=APP_VERSION,
   description="API for logging DHT sensor data via MQTT to a MySQL database.",
   docs_url="/docs",
   redoc_url="/redoc",
+  default_response_class=ORJSONResponse,
   lifespan=lifespan
 )
 
 app.mount('/static', StaticFiles(directory=join(dirname(__file__), "static")), name='static')
 templ = Jinja2Templates(directory=join(dirname(__file__), "templates"))
 
+# Pages only vary by the url_for() links, so rendered bytes are cached per
+# (template, base URL) with a strong ETag; capped since Host is client-supplied
+PAGE_CACHE_MAX = 32
+_page_cache: dict[tuple[str, str], tuple[bytes, str]] = {}
+
+def render_cached(request: Request, name: str) -> tuple[bytes, str]:
+  """Get rendered template bytes and ETag, rendering once per base URL"""
+  key = (name, str(request.base_url))
+  cached = _page_cache.get(key)
+  if cached is None:
+    body = templ.get_template(name).render(request=request).encode()
+    cached = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+    if len(_page_cache) < PAGE_CACHE_MAX:
+      _page_cache[key] = cached
+  return cached
+
 #############
 # Endpoints #
 #############
 
+# Upper bound for `limit` query params, caps worst-case scans
+MAX_QUERY_LIMIT = 1000
+
 @app.get("/health", tags=["Health"])
 async def health_check():
   """Health check endpoint"""
   return {
     "status": "ok",
-    "version": env.APP_VERSION,
+    "version": APP_VERSION,
     "database": "connected" if db.pool else "disconnected",
-    "mqtt": "connected" if mqtt_client.client else "disconnected"
+    "pool": db.pool_stats(),
+    "mqtt": "connected" if mqtt_client.client else "disconnected",
+    "mqtt_dropped": mqtt_client.dropped
   }
 
 @app.get("/", tags=["Index"], response_class=HTMLResponse)
 async def root(request: Request):
   """Main dashboard page"""
-  return templ.TemplateResponse(
-    request=request,
-    name='index.html'
+  body, etag = render_cached(request, 'index.html')
+  if request.headers.get('if-none-match') == etag:
+    return Response(status_code=304, headers={"ETag": etag})
+  return HTMLResponse(
+    body,
+    headers={"ETag": etag, "Cache-Control": "public, max-age=60"}
   )
 
+# Column order of the /api/logs SELECT (rows are fetched as tuples)
+LOG_COLUMNS = (
+  "log_id",
+  "device_id",
+  "mac_address",
+  "temperature",
+  "humidity",
+  "timestamp"
+)
+
+# Only the raw DATETIME is selected, ORJSONResponse encodes it as ISO 8601
+_LOGS_SELECT = """
+    SELECT 
+      log_id, 
+      device_id, 
+      mac_address, 
+      temperature, 
+      humidity, 
+      timestamp
+    FROM sensor_data 
+"""
+
+# Offset pagination, reads and discards `offset` rows
+LOGS_PAGE_QUERY = _LOGS_SELECT + """
+    ORDER BY timestamp DESC, log_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+# Keyset pagination, seeks straight to the cursor ((timestamp, log_id) is
+# ordered by idx_timestamp since InnoDB appends the PK to secondary indexes).
+# Spelled out instead of a row comparison, which the range optimizer does not
+# reliably turn into an index range
+LOGS_KEYSET_QUERY = _LOGS_SELECT + """
+    WHERE timestamp < %s OR (timestamp = %s AND log_id < %s)
+    ORDER BY timestamp DESC, log_id DESC
+    LIMIT %s
+"""
+
 @app.get("/api/logs", tags=["Logs"])
-async def get_logs(page: int = 1, limit: int = 10):
+async def get_logs(
+  page: int = Query(1, ge=1),
+  limit: int = Query(10, ge=1, le=200),
+  before_ts: Optional[datetime] = None,
+  before_id: Optional[int] = None
+):
   """
   Get paginated sensor logs
   
   Args:
-    page: Page number (starts from 1)
-    limit: Number of records per page (default: 10)
+    page: Page number (starts from 1), ignored when a cursor is given
+    limit: Number of records per page (default: 10, max: 200)
+    before_ts: Keyset cursor timestamp (`next_cursor` of previous response)
+    before_id: Keyset cursor log_id (`next_cursor` of previous response)
   """
   try:
-    # Calculate offset
-    offset = (page - 1) * limit
+    if (before_ts is None) != (before_id is None):
+      return {"success": False, "error": "before_ts and before_id must be given together"}
     
     # Get total count
     total = await get_total_logs()
@@ -137,32 +243,31 @@ async def get_logs(page: int = 1, limit: int = 10):
     # Calculate total pages
     total_pages = (total + limit - 1) // limit  # Ceiling division
     
-    # No FROM_UNIXTIME needed, timestamp is already DATETIME
-    query = f"""
-    SELECT 
-      log_id, 
-      device_id, 
-      mac_address, 
-      temperature, 
-      humidity, 
-      timestamp,
-      DATE_FORMAT(timestamp, '%Y-%m-%d %H:%i:%s') as datetime,
-      UNIX_TIMESTAMP(timestamp) as unix_timestamp
-    FROM sensor_data 
-    ORDER BY timestamp DESC 
-    LIMIT {limit} OFFSET {offset}
-    """
+    if before_ts is not None:
+      query, params = LOGS_KEYSET_QUERY, (before_ts, before_ts, before_id, limit)
+    else:
+      # Calculate offset
+      offset = (page - 1) * limit
+      query, params = LOGS_PAGE_QUERY, (limit, offset)
+    
+    async with db.get_readonly_cursor(dict_cursor=False) as cursor:
+      await cursor.execute(query, params)
+      rows = await cursor.fetchall()
+    
+    logs = [dict(zip(LOG_COLUMNS, row)) for row in rows]
     
-    async with db.get_cursor() as cursor:
-      await cursor.execute(query)
-      logs = await cursor.fetchall()
+    # Cursor for the next (older) page, None when this was the last one
+    next_cursor = None
+    if len(logs) == limit:
+      next_cursor = {"before_ts": logs[-1]['timestamp'], "before_id": logs[-1]['log_id']}
     
     return {
       "success": True,
-      "page": page,
+      "page": page if before_ts is None else None,
       "limit": limit,
       "total": total,
       "total_pages": total_pages,
+      "next_cursor": next_cursor,
       "data": logs
     }
   except Exception as e:
@@ -170,7 +275,7 @@ async def get_logs(page: int = 1, limit: int = 10):
     return {"success": False, "error": str(e)}
 
 @app.get("/api/logs/latest", tags=["Logs"])
-async def get_latest_sensor_data(limit: int = 10):
+async def get_latest_sensor_data(limit: int = Query(10, ge=1, le=MAX_QUERY_LIMIT)):
   """Get latest sensor readings from database"""
   try:
     readings = await get_latest_readings(limit)
@@ -184,7 +289,7 @@ async def get_latest_sensor_data(limit: int = 10):
     return {"success": False, "error": str(e)}
 
 @app.get("/api/logs/device/{device_id}", tags=["Logs"])
-async def get_device_log_history(device_id: str, limit: int = 50):
+async def get_device_log_history(device_id: str, limit: int = Query(50, ge=1, le=MAX_QUERY_LIMIT)):
   """Get log history for a specific device"""
   try:
     logs = await get_device_logs(device_id, limit)
@@ -199,7 +304,7 @@ async def get_device_log_history(device_id: str, limit: int = 50):
     return {"success": False, "error": str(e)}
 
 @app.get("/api/logs/mac/{mac_address}", tags=["Logs"])
-async def get_logs_by_mac_address(mac_address: str, limit: int = 50):
+async def get_logs_by_mac_address(mac_address: str, limit: int = Query(50, ge=1, le=MAX_QUERY_LIMIT)):
   """Get logs for a specific MAC address"""
   try:
     logs = await get_logs_by_mac(mac_address, limit)
@@ -231,33 +336,16 @@ async def get_device_statistics(device_id: str):
 async def get_overview_stats():
   """Get overall statistics"""
   try:
-    total = await get_total_logs()
-    
-    # Get unique devices count
-    query = "SELECT COUNT(DISTINCT device_id) as unique_devices FROM sensor_data"
-    async with db.get_cursor() as cursor:
-      await cursor.execute(query)
-      result = await cursor.fetchone()
-      unique_devices = result['unique_devices']
-    
-    # No FROM_UNIXTIME needed
-    query_latest = """
-    SELECT 
-      MAX(timestamp) as latest_time,
-      UNIX_TIMESTAMP(MAX(timestamp)) as latest_ts
-    FROM sensor_data
-    """
-    async with db.get_cursor() as cursor:
-      await cursor.execute(query_latest)
-      result_latest = await cursor.fetchone()
+    # Total, unique devices and latest timestamp in one round-trip
+    overview = await get_logs_overview()
     
     return {
       "success": True,
       "stats": {
-          "total_logs": total,
-          "unique_devices": unique_devices,
-          "latest_timestamp": result_latest['latest_ts'],
-          "latest_time": str(result_latest['latest_time']) if result_latest['latest_time'] else None
+          "total_logs": overview['total'],
+          "unique_devices": overview['unique_devices'],
+          "latest_timestamp": overview['latest_ts'],
+          "latest_time": overview['latest_time']
       }
     }
   except Exception as e:
@@ -279,7 +367,7 @@ async def get_devices_list():
     return {"success": False, "error": str(e)}
 
 @app.get("/api/chart/device/{device_id}", tags=["Chart"])
-async def get_device_chart(device_id: str, limit: int = 50):
+async def get_device_chart(device_id: str, limit: int = Query(50, ge=1, le=MAX_QUERY_LIMIT)):
   """Get chart data for a specific device"""
   try:
     data = await get_device_chart_data(device_id, limit)
@@ -294,7 +382,7 @@ async def get_device_chart(device_id: str, limit: int = 50):
     return {"success": False, "error": str(e)}
 
 @app.get("/api/chart/all-devices", tags=["Chart"])
-async def get_all_devices_chart(metric: str = "temperature", limit: int = 50):
+async def get_all_devices_chart(metric: str = "temperature", limit: int = Query(50, ge=1, le=MAX_QUERY_LIMIT)):
   """
   Get chart data for all devices for a specific metric
   
@@ -334,6 +422,10 @@ async def get_device_chart_by_range(device_id: str, range: str = "1d"):
   Returns:
     Current value + historical data (max 100 points)
   """
+  # Latest value doesn't depend on the range, fetch it concurrently
+  # on its own pool connection while the range queries run
+  current_task = asyncio.create_task(get_current_reading(device_id))
+  
   try:
     # Calculate time range in minutes
     range_mapping = {
@@ -349,148 +441,93 @@ async def get_device_chart_by_range(device_id: str, range: str = "1d"):
     
     logger.info(f"📊 Fetching data for range: {range} ({minutes} minutes)")
     
+    # Downsample to ~100 points by averaging fixed-width time buckets,
+    # a single grouped pass instead of ROW_NUMBER() + MOD over every row
+    target_points = 100
+    bucket_seconds = max(1, (minutes * 60) // target_points)
+    
     # Different logic for "live" vs historical ranges
     if range == "live":
       # Live: Rolling window from NOW
-      count_query = """
-      SELECT COUNT(*) as total
+      query = """
+      SELECT 
+          ROUND(AVG(temperature), 2) as temperature,
+          ROUND(AVG(humidity), 2) as humidity,
+          MIN(timestamp) as timestamp,
+          COUNT(*) as samples
       FROM sensor_data 
       WHERE device_id = %s
       AND timestamp >= DATE_SUB(NOW(), INTERVAL %s MINUTE)
+      GROUP BY FLOOR(UNIX_TIMESTAMP(timestamp) / %s)
+      ORDER BY MIN(timestamp) ASC
       """
       
-      async with db.get_cursor() as cursor:
-          await cursor.execute(count_query, (device_id, minutes))
-          count_result = await cursor.fetchone()
-          total_records = count_result['total']
-      
-      logger.info(f"📊 Total records in range (Live): {total_records}")
-      
-      # Calculate sampling interval
-      target_points = 100
-      interval = max(1, total_records // target_points) if total_records > 0 else 1
-      
-      logger.info(f"📊 Sampling interval: {interval}, Expected points: ~{total_records // interval if total_records > 0 else 0}")
-      
-      # Query data (rolling window from NOW)
-      query = """
-      SELECT 
-          temperature,
-          humidity,
-          timestamp,
-          DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i:%%s') as datetime
-      FROM (
-          SELECT 
-              temperature,
-              humidity,
-              timestamp,
-              ROW_NUMBER() OVER (ORDER BY timestamp ASC) as row_num
-          FROM sensor_data 
-          WHERE device_id = %s
-          AND timestamp >= DATE_SUB(NOW(), INTERVAL %s MINUTE)
-      ) AS numbered
-      WHERE MOD(row_num - 1, %s) = 0
-      ORDER BY timestamp ASC
-      """
-      
-      async with db.get_cursor() as cursor:
-          await cursor.execute(query, (device_id, minutes, interval))
-          history = await cursor.fetchall()
+      async with db.get_readonly_cursor(dict_cursor=False) as cursor:
+          await cursor.execute(query, (device_id, minutes, bucket_seconds))
+          rows = await cursor.fetchall()
       
       # Calculate window for live
-      from datetime import datetime, timedelta
       now = datetime.now()
       window_start = now - timedelta(minutes=minutes)
       window_end = now
       
     else:
-      # Historical ranges: Fixed window from FIRST timestamp
-      query_first = """
-      SELECT MIN(timestamp) as first_timestamp
-      FROM sensor_data 
+      # Historical ranges: Fixed window from FIRST timestamp, looked up
+      # in the same statement (CTE) instead of a separate round-trip
+      query = """
+      WITH bounds AS (
+        SELECT MIN(timestamp) as first_timestamp
+        FROM sensor_data 
+        WHERE device_id = %s
+      )
+      SELECT 
+        ROUND(AVG(temperature), 2) as temperature,
+        ROUND(AVG(humidity), 2) as humidity,
+        MIN(timestamp) as timestamp,
+        COUNT(*) as samples,
+        bounds.first_timestamp
+      FROM sensor_data, bounds
       WHERE device_id = %s
+      AND timestamp BETWEEN bounds.first_timestamp
+        AND DATE_ADD(bounds.first_timestamp, INTERVAL %s MINUTE)
+      GROUP BY bounds.first_timestamp, FLOOR(UNIX_TIMESTAMP(timestamp) / %s)
+      ORDER BY MIN(timestamp) ASC
       """
       
-      async with db.get_cursor() as cursor:
-        await cursor.execute(query_first, (device_id,))
-        first_result = await cursor.fetchone()
-        first_timestamp = first_result['first_timestamp']
+      async with db.get_readonly_cursor(dict_cursor=False) as cursor:
+        await cursor.execute(query, (device_id, device_id, minutes, bucket_seconds))
+        rows = await cursor.fetchall()
       
-      if not first_timestamp:
+      # No first timestamp means no rows at all
+      if not rows:
         return {
           "success": False,
           "error": "No data found for this device"
         }
       
+      first_timestamp = rows[0][4]
       logger.info(f"📊 First data timestamp: {first_timestamp}")
       
-      # Count total records in fixed time window
-      count_query = """
-      SELECT COUNT(*) as total
-      FROM sensor_data 
-      WHERE device_id = %s
-      AND timestamp >= %s
-      AND timestamp <= DATE_ADD(%s, INTERVAL %s MINUTE)
-      """
-      
-      async with db.get_cursor() as cursor:
-        await cursor.execute(count_query, (device_id, first_timestamp, first_timestamp, minutes))
-        count_result = await cursor.fetchone()
-        total_records = count_result['total']
-      
-      logger.info(f"📊 Total records in range ({range}): {total_records}")
-      
-      # Calculate sampling interval
-      target_points = 100
-      interval = max(1, total_records // target_points) if total_records > 0 else 1
-      
-      logger.info(f"📊 Sampling interval: {interval}, Expected points: ~{total_records // interval if total_records > 0 else 0}")
-      
-      # Query data (fixed window from first_timestamp)
-      query = """
-      SELECT 
-        temperature,
-        humidity,
-        timestamp,
-        DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i:%%s') as datetime
-      FROM (
-        SELECT 
-          temperature,
-          humidity,
-          timestamp,
-          ROW_NUMBER() OVER (ORDER BY timestamp ASC) as row_num
-        FROM sensor_data 
-        WHERE device_id = %s
-        AND timestamp >= %s
-        AND timestamp <= DATE_ADD(%s, INTERVAL %s MINUTE)
-      ) AS numbered
-      WHERE MOD(row_num - 1, %s) = 0
-      ORDER BY timestamp ASC
-      """
-      
-      async with db.get_cursor() as cursor:
-        await cursor.execute(query, (device_id, first_timestamp, first_timestamp, minutes, interval))
-        history = await cursor.fetchall()
-      
       # Calculate window for historical ranges
-      from datetime import timedelta
       window_start = first_timestamp
       window_end = first_timestamp + timedelta(minutes=minutes)
     
+    # Rows come back as tuples; dicts are built only for the <=100 buckets.
+    # "datetime" is the raw DATETIME, ORJSONResponse encodes it as ISO 8601
+    history = [
+      {"temperature": r[0], "humidity": r[1], "timestamp": r[2], "datetime": r[2]}
+      for r in rows
+    ]
+    
+    # Bucket counts replace the separate COUNT(*) query
+    total_records = sum(r[3] for r in rows)
+    interval = max(1, total_records // len(history)) if history else 1
+    
+    logger.info(f"📊 Total records in range ({range}): {total_records}, bucket: {bucket_seconds}s")
     logger.info(f"✅ Returned {len(history)} data points")
     
     # Get current (latest) value
-    query_current = """
-    SELECT temperature, humidity, timestamp
-    FROM sensor_data 
-    WHERE device_id = %s
-    ORDER BY timestamp DESC
-    LIMIT 1
-    """
-    
-    async with db.get_cursor() as cursor:
-      await cursor.execute(query_current, (device_id,))
-      current = await cursor.fetchone()
+    current = await current_task
     
     if not current:
       return {
@@ -508,46 +545,63 @@ async def get_device_chart_by_range(device_id: str, range: str = "1d"):
       "total_records": total_records,
       "sampled_points": len(history),
       "sampling_interval": interval,
+      "bucket_seconds": bucket_seconds,
       "current": {
         "temperature": current['temperature'],
         "humidity": current['humidity'],
-        "timestamp": str(current['timestamp'])
+        "timestamp": current['timestamp']
       },
       "history": history
     }
   except Exception as e:
     logger.error(f"❌ Error fetching range data: {e}")
     return {"success": False, "error": str(e)}
+  finally:
+    # Early returns/errors must not leave the query running, and awaiting
+    # it retrieves a failure nobody else read ("exception never retrieved")
+    current_task.cancel()
+    with suppress(asyncio.CancelledError, Exception):
+      await current_task
 
 # Custom 404 Handler
 @app.exception_handler(404)
 async def custom_404_handler(request: Request, exc):
   """Custom 404 error page"""
-  return templ.TemplateResponse(
-    request=request,
-    name="404.html",
-    status_code=404
-  )
+  body, etag = render_cached(request, '404.html')
+  return HTMLResponse(body, status_code=404, headers={"ETag": etag})
 
 
 ################
 # SSE Endpoint #
 ################
 
-# SSE event queue
-sse_clients = []
+# SSE fan-out: one shared ring of encoded frames, subscribers track the epoch
+# they last sent and wake on a shared event (producer never awaits per client)
+SSE_RING_SIZE = 1024
+_SSE_PREFIX = b"event: batch\ndata: "
+_SSE_SUFFIX = b"\n\n"
+_sse_ring: deque[bytes] = deque(maxlen=SSE_RING_SIZE)
+_sse_event = asyncio.Event()
+_sse_epoch = 0  # Number of frames published so far
 
 async def sse_event_generator():
   """Generator for Server-Sent Events"""
-  queue = asyncio.Queue()
-  sse_clients.append(queue)
+  last_epoch = _sse_epoch
   
-  try:
-    while True:
-      data = await queue.get()
-      yield f"data: {json.dumps(data)}\n\n"
-  except asyncio.CancelledError:
-    sse_clients.remove(queue)
+  while True:
+    if last_epoch == _sse_epoch:
+      await _sse_event.wait()
+    
+    # Frames published since last wake-up; a client that fell more than
+    # SSE_RING_SIZE frames behind just loses the oldest ones
+    missed = min(_sse_epoch - last_epoch, len(_sse_ring))
+    last_epoch = _sse_epoch
+    
+    # Coalesce everything missed into a single write to the client
+    if missed == 1:
+      yield _sse_ring[-1]
+    else:
+      yield b"".join(islice(_sse_ring, len(_sse_ring) - missed, None))
 
 @app.get("/api/events/stream", tags=["SSE"])
 async def sse_stream():
@@ -562,10 +616,14 @@ async def sse_stream():
     }
   )
 
-async def broadcast_new_log(log_data: dict):
-  """Broadcast new log to all SSE clients"""
-  for queue in sse_clients:
-    try:
-      await queue.put(log_data)
-    except Exception as e:
-      logger.error(f"Failed to broadcast to SSE client: {e}")
\ No newline at end of file
+async def broadcast_new_log(events: list[dict]):
+  """Broadcast a batch of new logs to all SSE clients as one frame"""
+  global _sse_epoch
+  
+  # Encode the SSE frame once, not once per client
+  _sse_ring.append(_SSE_PREFIX + orjson.dumps(events) + _SSE_SUFFIX)
+  _sse_epoch += 1
+  
+  # Wake every waiting subscriber, then re-arm for the next frame
+  _sse_event.set()
+  _sse_event.clear()
\ No newline at end of file
@@ -1,10 +1,29 @@
 from src.database import db
+import aiomysql
 import logging
+import time
+import asyncio
 from typing import Optional
+from functools import lru_cache
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# In-process count cache, re-queried after TTL (seconds) to correct drift
+TOTAL_LOGS_TTL = 60
+_total_logs_cache = {"value": None, "ts": 0.0}
+
+def _cache_get(cache: dict, ttl: float):
+  """Get cached value, or None if missing/expired"""
+  if cache["value"] is not None and time.monotonic() - cache["ts"] < ttl:
+    return cache["value"]
+  return None
+
+def _cache_set(cache: dict, value):
+  """Store value in cache with current timestamp"""
+  cache["value"] = value
+  cache["ts"] = time.monotonic()
+
 async def init_tables():
   """Initialize database tables with DATETIME (no created_at)"""
   create_table_query = """
@@ -15,79 +34,286 @@ async def init_tables():
     temperature FLOAT NOT NULL,
     humidity FLOAT NOT NULL,
     timestamp DATETIME NOT NULL,
-    INDEX idx_device_id (device_id),
+    INDEX idx_device_ts (device_id, timestamp),
     INDEX idx_mac_address (mac_address),
     INDEX idx_timestamp (timestamp)
   ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
   """
   
+  # Tables created before the composite index still have idx_device_id
+  query_indexes = """
+  SELECT DISTINCT INDEX_NAME as name
+  FROM information_schema.STATISTICS
+  WHERE TABLE_SCHEMA = DATABASE()
+  AND TABLE_NAME = 'sensor_data'
+  AND INDEX_NAME IN ('idx_device_id', 'idx_device_ts')
+  """
+  
+  # Single-row log counter, so total count is a PK lookup instead of COUNT(*)
+  create_stats_query = """
+  CREATE TABLE IF NOT EXISTS sensor_data_stats (
+    id TINYINT PRIMARY KEY,
+    counter BIGINT NOT NULL
+  ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+  """
+  
+  # Seed the counter from existing rows (only on first run). The COUNT(*)
+  # sits in a scalar subquery of a zero-row SELECT once the counter exists,
+  # so later startups never evaluate it
+  seed_stats_query = """
+  INSERT IGNORE INTO sensor_data_stats (id, counter)
+  SELECT 1, (SELECT COUNT(*) FROM sensor_data) FROM DUAL
+  WHERE NOT EXISTS (SELECT 1 FROM sensor_data_stats)
+  """
+  
+  # One row per device, kept up to date by the insert flusher, so device
+  # lists/counts never scan sensor_data
+  create_devices_query = """
+  CREATE TABLE IF NOT EXISTS devices (
+    device_id VARCHAR(100) PRIMARY KEY,
+    mac_address VARCHAR(17) NOT NULL,
+    first_seen DATETIME NOT NULL,
+    last_seen DATETIME NOT NULL,
+    log_count BIGINT NOT NULL
+  ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+  """
+  
+  # Backfill from existing rows (only while the summary table is empty)
+  seed_devices_query = """
+  INSERT IGNORE INTO devices (device_id, mac_address, first_seen, last_seen, log_count)
+  SELECT device_id, MAX(mac_address), MIN(timestamp), MAX(timestamp), COUNT(*)
+  FROM sensor_data
+  WHERE NOT EXISTS (SELECT 1 FROM devices)
+  GROUP BY device_id
+  """
+  
   try:
     async with db.get_cursor() as cursor:
       await cursor.execute(create_table_query)
-      await cursor.connection.commit()
+      
+      # One-time migration: (device_id, timestamp) covers device_id lookups
+      # by its leftmost prefix, and serves device + time range scans in
+      # index order (no filesort)
+      await cursor.execute(query_indexes)
+      indexes = {row['name'] for row in await cursor.fetchall()}
+      alters = []
+      if 'idx_device_ts' not in indexes:
+        alters.append("ADD INDEX idx_device_ts (device_id, timestamp)")
+      if 'idx_device_id' in indexes:
+        alters.append("DROP INDEX idx_device_id")
+      if alters:
+        await cursor.execute(f"ALTER TABLE sensor_data {', '.join(alters)}")
+        logger.info("✅ sensor_data indexes migrated to idx_device_ts")
+      
+      await cursor.execute(create_stats_query)
+      await cursor.execute(seed_stats_query)
+      await cursor.execute(create_devices_query)
+      await cursor.execute(seed_devices_query)
       logger.info("✅ Tables initialized successfully")
   except Exception as e:
     logger.error(f"❌ Failed to initialize tables: {e}")
     raise
 
+# Batched inserts: MQTT handlers queue rows, a single flusher writes them
+# with one executemany + commit per batch instead of one commit per reading
+INSERT_BATCH_SIZE = 200
+INSERT_BATCH_LINGER = 0.01  # seconds to wait for more rows once one arrived
+INSERT_QUEUE_SIZE = 4 * INSERT_BATCH_SIZE  # bounds memory while the DB is down
+# (row, future, expires), None = stop. expires is a loop.time() deadline
+_insert_queue: asyncio.Queue = asyncio.Queue(maxsize=INSERT_QUEUE_SIZE)
+_flush_task: Optional[asyncio.Task] = None
+# Errors caused by a row's data; anything else (connection lost, server
+# gone) would fail every row the same way
+_ROW_ERRORS = (aiomysql.DataError, aiomysql.IntegrityError, aiomysql.ProgrammingError)
+
+@lru_cache(maxsize=INSERT_BATCH_SIZE)
+def _devices_upsert_query(n: int) -> str:
+  """Multi-row devices upsert for n summary rows. Built by hand because
+  aiomysql's executemany rewrite doesn't recognise the "AS new" row alias
+  and would fall back to one statement per device"""
+  return (
+    "INSERT INTO devices (device_id, mac_address, first_seen, last_seen, log_count) VALUES "
+    + ", ".join(["(%s, %s, %s, %s, %s)"] * n)
+    + """ AS new
+  ON DUPLICATE KEY UPDATE
+    mac_address = new.mac_address,
+    first_seen = LEAST(devices.first_seen, new.first_seen),
+    last_seen = GREATEST(devices.last_seen, new.last_seen),
+    log_count = devices.log_count + new.log_count"""
+  )
+
+def _readings(n: int) -> str:
+  return f"{n} sensor reading" if n == 1 else f"{n} sensor readings"
+
+async def _write_batch(batch: list[tuple[tuple, asyncio.Future]]):
+  """Write queued rows in one transaction and resolve their log_ids"""
+  
+  query = """
+  INSERT INTO sensor_data (device_id, mac_address, temperature, humidity, timestamp) 
+  VALUES (%s, %s, %s, %s, %s)
+  """
+  
+  counter_query = "UPDATE sensor_data_stats SET counter = counter + %s WHERE id = 1"
+  
+  # One summary row per device in this batch: [mac, first_seen, last_seen, count]
+  device_rows = {}
+  for (device_id, mac_address, _, _, ts), _ in batch:
+    summary = device_rows.get(device_id)
+    if summary is None:
+      device_rows[device_id] = [mac_address, ts, ts, 1]
+    else:
+      summary[0] = mac_address
+      summary[1] = min(summary[1], ts)
+      summary[2] = max(summary[2], ts)
+      summary[3] += 1
+  
+  try:
+    async with db.get_cursor() as cursor:
+      # Rewritten by aiomysql into one multi-row INSERT; lastrowid is the
+      # first id and the rest are consecutive (single writer, simple insert)
+      await cursor.executemany(query, [row for row, _ in batch])
+      first_id = cursor.lastrowid
+      # Same transaction as the INSERT, so the counter never drifts
+      await cursor.execute(counter_query, (len(batch),))
+      await cursor.execute(
+        _devices_upsert_query(len(device_rows)),
+        [value for device_id, summary in device_rows.items() for value in (device_id, *summary)]
+      )
+  except _ROW_ERRORS as e:
+    logger.error(f"❌ Failed to insert {_readings(len(batch))}: {e}")
+    if len(batch) > 1:
+      # The batch was rolled back as a whole; retry row by row so one bad
+      # reading only fails itself
+      for item in batch:
+        await _write_batch([item])
+      return
+    for _, future in batch:
+      if not future.done():
+        future.set_result(None)
+    return
+  except Exception as e:
+    # Connection-level failure: retrying row by row would only repeat it
+    logger.error(f"❌ Failed to insert {_readings(len(batch))}: {e}")
+    for _, future in batch:
+      if not future.done():
+        future.set_result(None)
+    return
+  
+  for i, (_, future) in enumerate(batch):
+    if not future.done():
+      future.set_result(first_id + i)
+  
+  # Keep cached total in step without re-querying
+  if _total_logs_cache["value"] is not None:
+    _total_logs_cache["value"] += len(batch)
+  
+  logger.info(
+    "✅ [LOG %d-%d] Inserted %s", first_id, first_id + len(batch) - 1, _readings(len(batch))
+  )
+
+async def _flush_loop():
+  """Drain the queue into batches of INSERT_BATCH_SIZE, lingering at most
+  INSERT_BATCH_LINGER after the first row so a lone reading isn't delayed"""
+  loop = asyncio.get_running_loop()
+  stopping = False
+  
+  while not stopping:
+    item = await _insert_queue.get()
+    if item is None:
+      break
+    batch = [item]
+    deadline = loop.time() + INSERT_BATCH_LINGER
+    
+    while len(batch) < INSERT_BATCH_SIZE:
+      if _insert_queue.empty():
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+          break
+        try:
+          item = await asyncio.wait_for(_insert_queue.get(), timeout=remaining)
+        except asyncio.TimeoutError:
+          break
+      else:
+        item = _insert_queue.get_nowait()
+      
+      if item is None:
+        stopping = True
+        break
+      batch.append(item)
+    
+    # Rows whose caller gave up or whose deadline passed are failed here,
+    # before the write starts, so a timed-out reading is never stored
+    now = loop.time()
+    live = []
+    for row, future, expires in batch:
+      if future.done():
+        continue
+      if expires is not None and expires <= now:
+        future.set_exception(asyncio.TimeoutError())
+      else:
+        live.append((row, future))
+    
+    if live:
+      await _write_batch(live)
+
+def start_insert_flusher():
+  """Start the background insert flusher (call after the pool exists)"""
+  global _flush_task
+  if _flush_task is None:
+    _flush_task = asyncio.create_task(_flush_loop())
+
+async def stop_insert_flusher():
+  """Stop the flusher after it has written whatever is already queued"""
+  global _flush_task
+  if _flush_task is not None:
+    # Sentinel goes behind the queued rows, so they are flushed first
+    await _insert_queue.put(None)
+    await _flush_task
+    _flush_task = None
+
 async def insert_sensor_data_from_mqtt(
   device_id: str,
   mac_address: str,
   temperature: float,
   humidity: float,
-  timestamp: str  # STRING datetime (ISO 8601)
+  timestamp: datetime,  # Parsed once by the MQTT handler
+  timeout: Optional[float] = None
 ) -> Optional[int]:
   """
-  Insert sensor data from MQTT message
+  Queue sensor data from MQTT message for the next batched insert
   
   Args:
     device_id: Device ID from ESP32
     mac_address: MAC address of the ESP32
     temperature: Temperature reading
     humidity: Humidity reading
-    timestamp: ISO 8601 datetime string (e.g., "2025-01-11T12:30:45" or "2025-01-11 12:30:45")
+    timestamp: Reading datetime, already validated
+    timeout: Seconds the row may wait for its batch to start (None = no limit)
   
   Returns:
-    Last inserted log_id or None if failed
-  """
-  query = """
-  INSERT INTO sensor_data (device_id, mac_address, temperature, humidity, timestamp) 
-  VALUES (%s, %s, %s, %s, %s)
+    Inserted log_id once the batch is committed, or None if failed
+  
+  Raises:
+    asyncio.TimeoutError: The batch didn't start within timeout (the row is not written)
   """
+  loop = asyncio.get_running_loop()
+  future = loop.create_future()
+  # The flusher checks the deadline when it dequeues the row, so there is
+  # no timer per message and the ACK always matches what was stored
+  expires = loop.time() + timeout if timeout is not None else None
   
+  # Rows are queued in arrival order, so per-device order is preserved
   try:
-    # Parse and validate datetime string
-    # Support both ISO 8601 formats: "2025-01-11T12:30:45" and "2025-01-11 12:30:45"
-    timestamp_clean = timestamp.replace('T', ' ').replace('Z', '').strip()
-    
-    # Validate datetime format
-    try:
-      dt = datetime.fromisoformat(timestamp_clean)
-    except ValueError:
-      logger.error(f"Invalid datetime format: {timestamp}")
-      return None
-    
-    async with db.get_cursor() as cursor:
-      await cursor.execute(query, (
-        device_id, 
-        mac_address, 
-        temperature, 
-        humidity, 
-        timestamp_clean # "YYYY-MM-DD HH:MM:SS"
-      ))
-      await cursor.connection.commit()
-      log_id = cursor.lastrowid
-      
-      logger.info(
-          f"✅ [LOG {log_id}] Device {device_id} ({mac_address}): "
-          f"Temp={temperature}°C, Humidity={humidity}%, Time={timestamp_clean}"
-      )
-      
-      return log_id
-  
-  except Exception as e:
-    logger.error(f"❌ Failed to insert sensor data: {e}")
+    _insert_queue.put_nowait((
+      (device_id, mac_address, temperature, humidity, timestamp),
+      future,
+      expires
+    ))
+  except asyncio.QueueFull:
+    logger.error(f"❌ Insert queue full, dropping reading from {device_id}")
     return None
+  
+  return await future
 
 async def get_latest_readings(limit: int = 10):
   """Get latest sensor readings"""
@@ -98,15 +324,13 @@ async def get_latest_readings(limit: int = 10):
     mac_address, 
     temperature, 
     humidity, 
-    timestamp,
-    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i:%%s') as datetime,
-    UNIX_TIMESTAMP(timestamp) as unix_timestamp
+    timestamp
   FROM sensor_data 
   ORDER BY timestamp DESC 
   LIMIT %s
   """
   
-  async with db.get_cursor() as cursor:
+  async with db.get_readonly_cursor() as cursor:
     await cursor.execute(query, (limit,))
     results = await cursor.fetchall()
     return results
@@ -120,16 +344,14 @@ async def get_device_logs(device_id: str, limit: int = 50):
     mac_address, 
     temperature, 
     humidity, 
-    timestamp,
-    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i:%%s') as datetime,
-    UNIX_TIMESTAMP(timestamp) as unix_timestamp
+    timestamp
   FROM sensor_data 
   WHERE device_id = %s
   ORDER BY timestamp DESC 
   LIMIT %s
   """
   
-  async with db.get_cursor() as cursor:
+  async with db.get_readonly_cursor() as cursor:
     await cursor.execute(query, (device_id, limit))
     results = await cursor.fetchall()
     return results
@@ -143,16 +365,14 @@ async def get_logs_by_mac(mac_address: str, limit: int = 50):
     mac_address, 
     temperature, 
     humidity, 
-    timestamp,
-    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i:%%s') as datetime,
-    UNIX_TIMESTAMP(timestamp) as unix_timestamp
+    timestamp
   FROM sensor_data 
   WHERE mac_address = %s
   ORDER BY timestamp DESC 
   LIMIT %s
   """
   
-  async with db.get_cursor() as cursor:
+  async with db.get_readonly_cursor() as cursor:
     await cursor.execute(query, (mac_address, limit))
     results = await cursor.fetchall()
     return results
@@ -176,19 +396,71 @@ async def get_device_stats(device_id: str):
   WHERE device_id = %s
   """
   
-  async with db.get_cursor() as cursor:
+  async with db.get_readonly_cursor() as cursor:
     await cursor.execute(query, (device_id,))
     result = await cursor.fetchone()
     return result
 
+async def _fetch_one(query: str, params: Optional[tuple] = None):
+  """Run a single-row query in one round-trip"""
+  async with db.get_readonly_cursor() as cursor:
+    await cursor.execute(query, params)
+    return await cursor.fetchone()
+
 async def get_total_logs():
-  """Get total number of logs"""
-  query = "SELECT COUNT(*) as total FROM sensor_data"
+  """Get total number of logs (cached)"""
+  total = _cache_get(_total_logs_cache, TOTAL_LOGS_TTL)
+  if total is None:
+    result = await _fetch_one("SELECT counter as total FROM sensor_data_stats WHERE id = 1")
+    total = result['total'] if result else 0
+    _cache_set(_total_logs_cache, total)
+  return total
+
+async def get_logs_overview():
+  """Get total logs, unique devices and latest timestamp"""
+  total = _cache_get(_total_logs_cache, TOTAL_LOGS_TTL)
   
-  async with db.get_cursor() as cursor:
-    await cursor.execute(query)
-    result = await cursor.fetchone()
-    return result['total']
+  if total is None:
+    # Cold cache: everything in a single query, then refill the cache
+    query = """
+    SELECT 
+      (SELECT counter FROM sensor_data_stats WHERE id = 1) as total,
+      (SELECT COUNT(*) FROM devices) as unique_devices,
+      MAX(timestamp) as latest_time,
+      UNIX_TIMESTAMP(MAX(timestamp)) as latest_ts
+    FROM sensor_data
+    """
+    result = await _fetch_one(query)
+    result['total'] = result['total'] or 0
+    _cache_set(_total_logs_cache, result['total'])
+    return result
+  
+  # Warm cache: device count from the summary table + latest timestamp
+  query_latest = """
+  SELECT 
+    (SELECT COUNT(*) FROM devices) as unique_devices,
+    MAX(timestamp) as latest_time,
+    UNIX_TIMESTAMP(MAX(timestamp)) as latest_ts
+  FROM sensor_data
+  """
+  result = await _fetch_one(query_latest)
+  return {"total": total, **result}
+
+async def get_current_reading(device_id: str):
+  """Get latest reading for a specific device"""
+  query = """
+  SELECT temperature, humidity, timestamp
+  FROM sensor_data 
+  WHERE device_id = %s
+  ORDER BY timestamp DESC
+  LIMIT 1
+  """
+  
+  return await _fetch_one(query, (device_id,))
+
+# Column order of the chart SELECTs (rows are fetched as tuples)
+_CHART_COLUMNS = ("temperature", "humidity", "timestamp")
+_METRIC_CHART_COLUMNS = ("value", "timestamp")
 
 async def get_device_chart_data(device_id: str, limit: int = 50):
   """Get chart data for a specific device (latest N readings)"""
@@ -196,33 +468,53 @@ async def get_device_chart_data(device_id: str, limit: int = 50):
   SELECT 
     temperature,
     humidity,
-    timestamp,
-    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i:%%s') as datetime,
-    UNIX_TIMESTAMP(timestamp) as unix_timestamp
+    timestamp
   FROM sensor_data 
   WHERE device_id = %s
   ORDER BY timestamp ASC
   LIMIT %s
   """
   
-  async with db.get_cursor() as cursor:
+  async with db.get_readonly_cursor(dict_cursor=False) as cursor:
     await cursor.execute(query, (device_id, limit))
-    results = await cursor.fetchall()
-    return results
+    rows = await cursor.fetchall()
+    return [dict(zip(_CHART_COLUMNS, row)) for row in rows]
 
 async def get_all_devices():
   """Get list of all unique devices"""
   query = """
-  SELECT DISTINCT device_id 
-  FROM sensor_data 
+  SELECT device_id 
+  FROM devices 
   ORDER BY device_id ASC
   """
   
-  async with db.get_cursor() as cursor:
+  async with db.get_readonly_cursor() as cursor:
     await cursor.execute(query)
     results = await cursor.fetchall()
     return [row['device_id'] for row in results]
 
+# Per-metric chart query, built once from a fixed whitelist of columns.
+# LATERAL runs the latest-N lookup per device row on idx_device_ts, so every
+# device comes back in one statement without ranking the whole table
+_METRIC_CHART_QUERIES = {
+  metric: f"""
+    SELECT 
+      d.device_id,
+      latest.value,
+      latest.timestamp
+    FROM devices d
+    CROSS JOIN LATERAL (
+      SELECT {metric} as value, timestamp
+      FROM sensor_data 
+      WHERE device_id = d.device_id
+      ORDER BY timestamp DESC
+      LIMIT %s
+    ) as latest
+    ORDER BY d.device_id ASC, latest.timestamp ASC
+    """
+  for metric in ('temperature', 'humidity')
+}
+
 # v0.1.3: Get all devices chart data for a specific metric
 async def get_all_devices_chart_data(metric: str, limit: int = 50):
   """
@@ -235,32 +527,19 @@ async def get_all_devices_chart_data(metric: str, limit: int = 50):
   Returns:
     Dict with device_id as key, and list of readings as value
   """
-  if metric not in ['temperature', 'humidity']:
+  if metric not in _METRIC_CHART_QUERIES:
     raise ValueError("Metric must be 'temperature' or 'humidity'")
   
-  # Get all devices
-  devices = await get_all_devices()
+  # Column names can't be bound as parameters, so pick a prebuilt query
+  query = _METRIC_CHART_QUERIES[metric]
   
-  result = {}
+  async with db.get_readonly_cursor(dict_cursor=False) as cursor:
+    await cursor.execute(query, (limit,))
+    rows = await cursor.fetchall()
   
-  for device_id in devices:
-    query = f"""
-    SELECT 
-      {metric} as value,
-      timestamp,
-      DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i:%%s') as datetime,
-      UNIX_TIMESTAMP(timestamp) as unix_timestamp
-    FROM sensor_data 
-    WHERE device_id = %s
-    ORDER BY timestamp DESC
-    LIMIT %s
-    """
-    
-    async with db.get_cursor() as cursor:
-      await cursor.execute(query, (device_id, limit))
-      readings = await cursor.fetchall()
-      
-      # Reverse to get chronological order (oldest first)
-      result[device_id] = list(reversed(readings))
+  # Rows are already grouped by device and in chronological order
+  result = {}
+  for device_id, *reading in rows:
+    result.setdefault(device_id, []).append(dict(zip(_METRIC_CHART_COLUMNS, reading)))
   
   return result
\ No newline at end of file
@@ -1,57 +1,148 @@
 import aiomqtt
 import asyncio
-import json
 import logging
+import msgspec
 import ssl
-from typing import Optional
+from typing import Annotated, Optional, Union
+from functools import lru_cache
 from datetime import datetime
 
 from src.config import get_settings
-from src.models import insert_sensor_data_from_mqtt
+from src.models import insert_sensor_data_from_mqtt, INSERT_BATCH_SIZE
 
 logger = logging.getLogger(__name__)
 env = get_settings()
 
-# Add this import at the top
-broadcast_callback = None
-
-async def set_broadcast_callback(callback):
-  """Set callback function for broadcasting new data"""
-  global broadcast_callback
-  broadcast_callback = callback
+# ACKs are coalesced into one publish. An ESP32 receives the whole batch on
+# the shared ACK topic, so batches stay small enough for its 4 KB
+# PubSubClient buffer (see iot/main.ino)
+ACK_BATCH_SIZE = 20
+ACK_FLUSH_DELAY = 0.005  # seconds to collect more ACKs before publishing
+
+class SensorMsg(msgspec.Struct):
+  """Sensor reading published by the ESP32"""
+  # Lengths match the sensor_data columns, so an oversized id is rejected
+  # here instead of failing the whole insert batch in strict mode.
+  # Numeric ids are accepted and stored as text, as before
+  device_id: Union[int, Annotated[str, msgspec.Meta(max_length=100)]]
+  mac_address: Annotated[str, msgspec.Meta(max_length=17)]
+  temperature: float
+  humidity: float
+  timestamp: datetime  # RFC 3339, e.g. "2025-01-11T12:30:45" (space separator also accepted)
+
+class _LooseSensorMsg(SensorMsg):
+  """SensorMsg with the timestamp left as a string, for ISO 8601 forms
+  that RFC 3339 rejects (e.g. no seconds)"""
+  timestamp: str
+
+class AckMsg(msgspec.Struct, frozen=True):
+  """Queued ACK for one reading"""
+  success: bool
+  device_id: Optional[str]
+  mac_address: Optional[str]
+  timestamp: Union[datetime, str, None]  # Reading timestamp, re-encoded as RFC 3339
+  log_id: Optional[int] = None
+  error: Optional[str] = None
+
+class AckBatch(msgspec.Struct):
+  """ACKs as parallel arrays (index i of every field is one ACK), so each
+  key is sent once per batch instead of once per ACK"""
+  success: list[bool]
+  device_id: list[Optional[str]]
+  mac_address: list[Optional[str]]
+  timestamp: list[Union[datetime, str, None]]
+  log_id: list[Optional[int]]
+  error: list[Optional[str]]
+
+# Built once: decoding with a typed Decoder skips the per-call type lookup,
+# and the ACK Encoder is shared by every flush
+_SENSOR_DECODER = msgspec.json.Decoder(SensorMsg)
+_LOOSE_SENSOR_DECODER = msgspec.json.Decoder(_LooseSensorMsg)
+_ACK_ENCODER = msgspec.json.Encoder()
+
+def _decode_sensor(payload) -> SensorMsg:
+  """Decode a reading, falling back to the lenient fromisoformat parse
+  for timestamps the RFC 3339 decoder rejects"""
+  try:
+    return _SENSOR_DECODER.decode(payload)
+  except msgspec.ValidationError:
+    # Still raises ValidationError if another field is the problem
+    loose = _LOOSE_SENSOR_DECODER.decode(payload)
+  try:
+    dt = datetime.fromisoformat(loose.timestamp.replace('T', ' ').replace('Z', '').strip())
+  except ValueError:
+    raise msgspec.ValidationError(
+      f"Invalid datetime format: '{loose.timestamp}'. Use ISO 8601 (e.g., '2025-01-11T12:30:45')"
+    ) from None
+  return SensorMsg(loose.device_id, loose.mac_address, loose.temperature, loose.humidity, dt)
+
+def _ack_ids(payload) -> dict:
+  """Best-effort ids from a payload that failed validation, so the
+  device can still match the error ACK to itself"""
+  try:
+    raw = msgspec.json.decode(payload)
+  except msgspec.DecodeError:
+    return {}
+  if not isinstance(raw, dict):
+    return {}
+  return {
+    "device_id": raw.get("device_id"),
+    "mac_address": raw.get("mac_address"),
+    "timestamp": raw.get("timestamp")
+  }
+
+@lru_cache(maxsize=1)
+def _tls_context() -> ssl.SSLContext:
+  """Build the broker TLS context once, reused by every (re)connect"""
+  # SERVER_AUTH: we are the client, verifying the broker's certificate
+  # and hostname (paho treats check_hostname=False as tls_insecure)
+  tls_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=env.MQTT_CA_CERT_FILE)
+  tls_context.verify_mode = ssl.CERT_REQUIRED
+  return tls_context
+
+@lru_cache(maxsize=1024)
+def _to_unix(dt: datetime) -> int:
+  """Epoch seconds for a naive device-local datetime, read in the process
+  zone (TZ, Asia/Jakarta in the Docker image) like the firmware clock
+  (cached, consecutive readings often share the second)"""
+  return int(dt.timestamp())
+
+# Fixed pool of handler coroutines fed by a bounded queue. Each handler waits
+# on its batched insert, so the pool must be as wide as an insert batch or
+# batches could never fill
+MESSAGE_WORKERS = INSERT_BATCH_SIZE
+MESSAGE_QUEUE_SIZE = 1024
+DRAIN_TIMEOUT = 10  # seconds disconnect waits for queued messages to be handled
 
 
 class MQTTClient:
-  def __init__(self):
+  def __init__(self, broadcast_callback=None):
     self.client: Optional[aiomqtt.Client] = None
+    self._broadcast = broadcast_callback
     self.task: Optional[asyncio.Task] = None
     self._stop_event = asyncio.Event()
+    self._ack_buf: list[AckMsg] = []
+    self._ack_event = asyncio.Event()
+    self._ack_task: Optional[asyncio.Task] = None
+    # New-log events ride the same flush timer and go out as one list
+    self._broadcast_buf: list[dict] = []
+    self._msg_queue: asyncio.Queue = asyncio.Queue(maxsize=MESSAGE_QUEUE_SIZE)
+    self._workers: list[asyncio.Task] = []
+    self.dropped = 0  # Messages dropped because the worker queue was full
+
+  def set_broadcast(self, callback):
+    """Set callback function for broadcasting new data"""
+    self._broadcast = callback
 
   async def connect(self):
     """Connect to MQTT broker with TLS"""
     try:
-      # Setup TLS context
-      tls_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-      tls_context.load_verify_locations(cafile=env.MQTT_CA_CERT_FILE)
-      tls_context.check_hostname = False
-      tls_context.verify_mode = ssl.CERT_REQUIRED
-
-      # Create client with TLS
-      tls_params = aiomqtt.TLSParameters(
-        ca_certs=env.MQTT_CA_CERT_FILE,
-        certfile=None,
-        keyfile=None,
-        cert_reqs=ssl.CERT_REQUIRED,
-        tls_version=ssl.PROTOCOL_TLS,
-        ciphers=None
-      )
-
-      # Build client parameters
+      # Build client parameters (TLS context is built on first connect)
       client_params = {
         "hostname": env.MQTT_BROKER_URL,
         "port": env.MQTT_BROKER_PORT,
         "keepalive": env.MQTT_KEEPALIVE,
-        "tls_params": tls_params
+        "tls_context": _tls_context()
       }
 
       # Add credentials if provided
@@ -65,7 +156,9 @@ class MQTTClient:
       await self.client.__aenter__()
       logger.info("✅ Connected to MQTT broker")
 
-      # Start message listener
+      # Start ACK publisher, message workers and message listener
+      self._ack_task = asyncio.create_task(self._ack_flusher())
+      self._workers = [asyncio.create_task(self._worker()) for _ in range(MESSAGE_WORKERS)]
       self.task = asyncio.create_task(self._message_listener())
 
     except Exception as e:
@@ -84,6 +177,28 @@ class MQTTClient:
         except asyncio.CancelledError:
           pass
 
+      # Let the workers finish what is already queued (one sentinel each,
+      # behind the queued messages) so every stored reading gets its ACK
+      if self._workers:
+        try:
+          await asyncio.wait_for(self._drain_workers(), DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+          logger.warning("⚠️ Message workers did not drain in time, cancelling")
+        for worker in self._workers:
+          worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+      if self._ack_task:
+        self._ack_task.cancel()
+        try:
+          await self._ack_task
+        except asyncio.CancelledError:
+          pass
+        # Publish ACKs and events still waiting for the next flush
+        await self._flush_acks()
+        await self._flush_broadcasts()
+
       if self.client:
         await self.client.__aexit__(None, None, None)
         logger.info("🔒 Disconnected from MQTT broker")
@@ -106,90 +221,72 @@ class MQTTClient:
         if self._stop_event.is_set():
           break
 
-        # Process message in background to not block listener
-        asyncio.create_task(self._handle_message(message))
+        # Hand off to the worker pool. Awaiting here would only move the
+        # backlog into aiomqtt's unbounded queue, so drop the newest instead
+        try:
+          self._msg_queue.put_nowait(message)
+        except asyncio.QueueFull:
+          self.dropped += 1
+          if self.dropped % 100 == 1:
+            logger.warning(f"⚠️ Worker queue full, dropped {self.dropped} messages so far")
 
     except asyncio.CancelledError:
       logger.info("📴 MQTT listener cancelled")
     except Exception as e:
       logger.error(f"❌ Error in MQTT listener: {e}")
 
+  async def _drain_workers(self):
+    """Queue one stop sentinel per worker and wait for all of them to exit"""
+    for _ in self._workers:
+      await self._msg_queue.put(None)
+    await asyncio.gather(*self._workers)
+
+  async def _worker(self):
+    """Handle queued messages one at a time until the None sentinel"""
+    while True:
+      message = await self._msg_queue.get()
+      if message is None:
+        return
+      await self._handle_message(message)
+
   async def _handle_message(self, message: aiomqtt.Message):
     """Handle incoming MQTT message"""
     try:
-      # Decode payload - handle bytes or str
-      if isinstance(message.payload, bytes):
-        payload = message.payload.decode('utf-8')
-      elif isinstance(message.payload, str):
-        payload = message.payload
-      else:
-        payload = str(message.payload)
+      # msgspec parses bytes directly, so there is no decode copy
+      payload = message.payload
+      if not isinstance(payload, (bytes, bytearray, str)):
+        payload = str(payload)
 
-      logger.info(f"📨 Received message on {message.topic}: {payload}")
+      # Only decode for the log line when it will actually be emitted
+      if logger.isEnabledFor(logging.INFO):
+        text = payload.decode('utf-8', 'replace') if isinstance(payload, (bytes, bytearray)) else payload
+        logger.info("📨 Received message on %s: %s", message.topic, text)
 
-      # Parse JSON
-      data = json.loads(payload)
-
-      # Validate required fields
-      required_fields = ["device_id", "mac_address", "temperature", "humidity", "timestamp"]
-      missing_fields = [field for field in required_fields if field not in data]
-
-      if missing_fields:
-        logger.error(f"❌ Missing required fields: {missing_fields}")
-        await self._send_ack(
-          success=False,
-          device_id=data.get("device_id"),
-          mac_address=data.get("mac_address"),
-          timestamp=data.get("timestamp"),
-          error=f"Missing fields: {missing_fields}"
-        )
+      # Parse JSON and check fields/types (timestamp included) in one pass
+      try:
+        data = _decode_sensor(payload)
+      except msgspec.ValidationError as e:
+        logger.error(f"❌ Invalid sensor message: {e}")
+        await self._send_ack(success=False, **_ack_ids(payload), error=str(e))
         return
 
-      # Extract and validate data
-      device_id = str(data["device_id"])
-      mac_address = str(data["mac_address"])
-      temperature = float(data["temperature"])
-      humidity = float(data["humidity"])
-      timestamp = data["timestamp"]  # ← Keep as-is (string or int)
+      device_id = str(data.device_id)
+      mac_address = data.mac_address
+      temperature = data.temperature
+      humidity = data.humidity
+      timestamp = data.timestamp
 
-      # Validate timestamp is string
-      if not isinstance(timestamp, str):
-        logger.error(f"❌ Timestamp must be string, got {type(timestamp).__name__}")
-        await self._send_ack(
-          success=False,
-          device_id=device_id,
-          mac_address=mac_address,
-          timestamp=str(timestamp),
-          error=f"Timestamp must be ISO 8601 string (e.g., '2025-01-11T12:30:45'), got {type(timestamp).__name__}"
-        )
-        return
+      # DATETIME column stores wall-clock time, drop any "Z"/offset
+      dt = timestamp.replace(tzinfo=None) if timestamp.tzinfo else timestamp
 
-      # Validate timestamp format (ISO 8601)
+      # Insert to database with timeout
       try:
-        # Normalize timestamp: "2025-01-11T12:30:45" or "2025-01-11 12:30:45"
-        timestamp_clean = timestamp.replace('T', ' ').replace('Z', '').strip()
-        datetime.fromisoformat(timestamp_clean)
-      except ValueError as e:
-        logger.error(f"❌ Invalid datetime format: {timestamp}")
-        await self._send_ack(
-          success=False,
+        log_id = await insert_sensor_data_from_mqtt(
           device_id=device_id,
           mac_address=mac_address,
-          timestamp=timestamp,
-          error=f"Invalid datetime format: '{timestamp}'. Use ISO 8601 (e.g., '2025-01-11T12:30:45')"
-        )
-        return
-
-      # Insert to database with timeout
-      try:
-        log_id = await asyncio.wait_for(
-          insert_sensor_data_from_mqtt(
-            device_id=device_id,
-            mac_address=mac_address,
-            temperature=temperature,
-            humidity=humidity,
-            timestamp=timestamp
-          ),
+          temperature=temperature,
+          humidity=humidity,
+          timestamp=dt,
           timeout=env.MQTT_ACK_TIMEOUT
         )
 
@@ -203,18 +300,19 @@ class MQTTClient:
             log_id=log_id
           )
 
-          # Broadcast to SSE clients
-          if broadcast_callback:
-            await broadcast_callback({
+          # Queue for the next batched SSE broadcast
+          if self._broadcast is not None:
+            self._broadcast_buf.append({
               "log_id": log_id,
               "device_id": device_id,
               "mac_address": mac_address,
               "temperature": temperature,
               "humidity": humidity,
               "timestamp": timestamp,
-              "datetime": timestamp.replace('T', ' ').replace('Z', '').strip(),
-              "unix_timestamp": int(datetime.fromisoformat(timestamp.replace('T', ' ').replace('Z', '').strip()).timestamp())
+              "datetime": dt.isoformat(sep=' '),
+              "unix_timestamp": _to_unix(dt)
             })
+            self._ack_event.set()
         else:
           # Send failure acknowledgment
           await self._send_ack(
@@ -235,7 +333,7 @@ class MQTTClient:
           error="Database timeout"
         )
 
-    except json.JSONDecodeError as e:
+    except msgspec.DecodeError as e:
       logger.error(f"❌ Invalid JSON payload: {e}")
     except ValueError as e:
       logger.error(f"❌ Invalid data type: {e}")
@@ -247,42 +345,80 @@ class MQTTClient:
     success: bool,
     device_id: Optional[str] = None,
     mac_address: Optional[str] = None,
-    timestamp: Optional[str] = None,  # ← Changed to str
+    timestamp: Union[datetime, str, None] = None,  # Raw string on validation errors
     log_id: Optional[int] = None,
     error: Optional[str] = None
   ):
-    """Send acknowledgment message back to MQTT"""
+    """Queue acknowledgment message for the next batched ACK publish"""
     try:
       # Check if client exists
       if not self.client:
         logger.error("❌ MQTT client not initialized, cannot send ACK")
         return
 
-      ack_payload = {
-        "success": success,
-        "device_id": device_id,
-        "mac_address": mac_address,
-        "timestamp": timestamp  # ← Return original timestamp
-      }
-
       if success and log_id:
-        ack_payload["log_id"] = log_id
-        ack_payload["message"] = "Data logged successfully"
-      elif error:
-        ack_payload["error"] = error
-
-      # Publish acknowledgment
-      await self.client.publish(
-        env.MQTT_TOPIC_ACK,
-        payload=json.dumps(ack_payload),
-        qos=env.MQTT_QOS
-      )
+        ack = AckMsg(success, device_id, mac_address, timestamp, log_id=log_id)
+      else:
+        ack = AckMsg(success, device_id, mac_address, timestamp, error=error)
 
-      status = "✅" if success else "❌"
-      logger.info(f"{status} Sent ACK to {env.MQTT_TOPIC_ACK}: {ack_payload}")
+      self._ack_buf.append(ack)
+      self._ack_event.set()
 
     except Exception as e:
-      logger.error(f"❌ Failed to send ACK: {e}")
+      logger.error(f"❌ Failed to queue ACK: {e}")
+
+  async def _ack_flusher(self):
+    """Publish queued ACKs and SSE events shortly after the first one arrives"""
+    while True:
+      await self._ack_event.wait()
+      await asyncio.sleep(ACK_FLUSH_DELAY)
+      self._ack_event.clear()
+      await self._flush_acks()
+      await self._flush_broadcasts()
+
+  async def _flush_broadcasts(self):
+    """Hand every queued new-log event to the broadcast callback in one call"""
+    if not self._broadcast_buf or self._broadcast is None:
+      return
+
+    events, self._broadcast_buf = self._broadcast_buf, []
+    try:
+      await self._broadcast(events)
+    except Exception as e:
+      logger.error(f"❌ Failed to broadcast {len(events)} events: {e}")
+
+  async def _flush_acks(self):
+    """Publish queued ACKs as AckBatch messages of at most ACK_BATCH_SIZE"""
+    while self._ack_buf and self.client:
+      batch = self._ack_buf[:ACK_BATCH_SIZE]
+      del self._ack_buf[:ACK_BATCH_SIZE]
+
+      columns = AckBatch(
+        success=[ack.success for ack in batch],
+        device_id=[ack.device_id for ack in batch],
+        mac_address=[ack.mac_address for ack in batch],
+        timestamp=[ack.timestamp for ack in batch],
+        log_id=[ack.log_id for ack in batch],
+        error=[ack.error for ack in batch]
+      )
+
+      try:
+        await self.client.publish(
+          env.MQTT_TOPIC_ACK,
+          payload=_ACK_ENCODER.encode(columns),  # bytes, published as-is
+          qos=env.MQTT_QOS
+        )
+
+        # Counting failures is only worth it when the line is emitted
+        if logger.isEnabledFor(logging.INFO):
+          failed = sum(1 for ack in batch if not ack.success)
+          logger.info(
+            "%s Sent %d ACKs (%d failed) to %s",
+            "❌" if failed else "✅", len(batch), failed, env.MQTT_TOPIC_ACK
+          )
+
+      except Exception as e:
+        logger.error(f"❌ Failed to send {len(batch)} ACKs: {e}")
 
 # Singleton instance
 mqtt_client = MQTTClient()
\ No newline at end of file
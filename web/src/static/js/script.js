@@ -382,28 +382,30 @@ function setupRealtimeUpdates() {
         showConnectionStatus(true);
     };
     
-    eventSource.onmessage = (event) => {
+    // Server sends "batch" events carrying a list of new logs
+    eventSource.addEventListener('batch', (event) => {
         try {
-            const newLog = JSON.parse(event.data);
-            console.log('📨 New data received:', newLog.device_id);
+            const newLogs = JSON.parse(event.data);
+            console.log('📨 New data received:', newLogs.length, 'logs');
             
-            // Only update if "Live" range is selected
-            if (selectedDevice && newLog.device_id === selectedDevice && selectedRange === 'live') {
+            // Only update if "Live" range is selected (once per batch)
+            if (selectedDevice && selectedRange === 'live' &&
+                newLogs.some(log => log.device_id === selectedDevice)) {
                 console.log('🔄 Updating current device data (Live mode)');
                 fetchDeviceData(selectedDevice, selectedRange);
             }
             
             // If no device selected yet, auto-select the first one
-            if (!selectedDevice) {
-                console.log('🎯 Auto-selecting device:', newLog.device_id);
-                selectDevice(newLog.device_id);
+            if (!selectedDevice && newLogs.length > 0) {
+                console.log('🎯 Auto-selecting device:', newLogs[0].device_id);
+                selectDevice(newLogs[0].device_id);
                 // Also refresh device list to show new device in navbar
                 fetchDevicesList();
             }
         } catch (error) {
             console.error('❌ SSE error:', error);
         }
-    };
+    });
     
     eventSource.onerror = () => {
         console.warn('⚠️ SSE disconnected, reconnecting...');